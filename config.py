@@ -17,6 +17,7 @@ burnbot_csv_url = os.getenv("burnbot_csv_url", 'https://storage.googleapis.com/s
 # Bot Settings
 CHECK_INTERVAL_HOURS = 6
 MICRO_STRD_DIVISOR = 1_000_000  # Convert microSTRD to STRD
+CSV_TAIL_BYTES = 4096  # Only the end of the CSV is fetched; it must hold at least one full row
 
 # Colors for Discord embeds
 COLOR_SUCCESS = 0x28a745  # Green
@@ -8,12 +8,15 @@ Author: STRD Burn Monitor Team
 License: MIT
 """
 
+import asyncio
+import ssl
 import discord
-from discord.ext import tasks
 import aiohttp
+import certifi
+import orjson
 import logging
-from datetime import datetime
-import hashlib
+from logging.handlers import RotatingFileHandler, MemoryHandler
+from datetime import datetime, timezone
 import re
 from typing import Optional, Tuple
 
@@ -24,21 +27,105 @@ from config import (
     burnbot_csv_url,
     CHECK_INTERVAL_HOURS,
     MICRO_STRD_DIVISOR,
+    CSV_TAIL_BYTES,
     COLOR_SUCCESS,
     COLOR_STRD
 )
 
-# Set up logging
+# Set up logging, with one formatter shared by the console and file handlers
+_log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# Size-capped log file, written in batches (flushed immediately on warnings and errors)
+_file_handler = RotatingFileHandler('strd_bot.log', maxBytes=5_000_000, backupCount=3)
+_file_handler.setFormatter(_log_formatter)
+_memory_handler = MemoryHandler(capacity=64, flushLevel=logging.WARNING, target=_file_handler)
+
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(_log_formatter)
+
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('strd_bot.log'),
-        logging.StreamHandler()
+        _memory_handler,
+        _stream_handler
     ]
 )
 logger: logging.Logger = logging.getLogger(__name__)
 
+# TLS context built once (loading the CA bundle) and shared by all HTTP connections
+_SSL_CTX = ssl.create_default_context(cafile=certifi.where())
+
+# Headers for webhook posts, whose JSON body is serialized with orjson
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Matches the burn total in usernames like "401,613 STRD Burned 🔥"
+_USERNAME_RE = re.compile(r'([\d,]+)\s+STRD')
+
+
+def format_strd(total_micro: int) -> str:
+    """
+    Format a microSTRD amount as STRD with six decimals using integer math.
+    
+    Args:
+        total_micro: The amount in microSTRD
+        
+    Returns:
+        The amount in STRD, e.g. "401,613.250000"
+    """
+    whole, fraction = divmod(total_micro, MICRO_STRD_DIVISOR)
+    return f"{whole:,}.{fraction:06d}"
+
+
+def _parse_tail_fast(tail: bytes) -> Optional[int]:
+    """
+    Read the burn total from the final row of a well-formed CSV tail.
+    
+    The burn CSV is produced by Stride's own export, so it ends with a complete
+    ASCII row whose second column is the running total in microSTRD. That shape
+    is checked up front instead of handled with exceptions, and the bytes are
+    parsed directly without decoding.
+    
+    Args:
+        tail: The end of the CSV as raw bytes
+        
+    Returns:
+        The total burned in microSTRD, or None if the last row is not well-formed
+    """
+    last_line = tail.rstrip().rpartition(b'\n')[2]
+    parts = last_line.split(b',', 2)
+    if len(parts) < 2 or not parts[1].isdigit():
+        return None
+    return int(parts[1])
+
+
+def _parse_tail_slow(csv_content: str) -> Optional[int]:
+    """
+    Find the burn total in the last valid line of the CSV.
+    
+    Fallback for when _parse_tail_fast fails. Scans backwards from the end
+    without splitting the whole file, skipping blank and malformed lines.
+    
+    Args:
+        csv_content: The CSV text to scan
+        
+    Returns:
+        The total burned in microSTRD, or None if no line could be parsed
+    """
+    end = len(csv_content)
+    while end > 0:
+        newline = csv_content.rfind('\n', 0, end)
+        line = csv_content[newline + 1:end].strip()
+        end = newline
+        
+        parts = line.split(',', 2)
+        if len(parts) >= 2:
+            try:
+                return int(parts[1])
+            except ValueError:
+                continue
+    
+    return None
+
 
 class STRDBurnMonitor(discord.Client):
     """
@@ -58,27 +145,57 @@ class STRDBurnMonitor(discord.Client):
         intents.guilds = True
         super().__init__(intents=intents)
         
-        # Bot state
-        self.last_csv_hash: Optional[str] = None
-        self.last_total_burned: float = 0.0
+        # Bot state (last_check_time records when the total last changed)
+        self.last_total_burned_micro: int = 0
         self.last_check_time: Optional[str] = None
         
+        # Webhook configuration is fixed at startup, so resolve it once
+        self._webhook_enabled: bool = bool(burnbot_logs_webhookurl) and burnbot_logs_webhookurl != "YOUR_WEBHOOK_URL_HERE"
+        self._webhook_footer: dict = {"text": "STRD Burn Monitor"}
+        
+        # Last username successfully applied, so identical edits can be skipped
+        self._last_username: Optional[str] = None
+        
+        # HTTP validators from the last full CSV download, used for conditional GETs
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        
+        # Shared HTTP session, created in setup_hook once the event loop is running
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._monitor_task: Optional[asyncio.Task] = None
+        
     async def setup_hook(self) -> None:
         """
         Called when the bot is starting up.
         
-        Starts the CSV monitoring task.
+        Creates the shared HTTP session and starts the CSV monitoring task.
         """
+        # Reuse one session for all CSV fetches and webhook posts (keep-alive pooling)
+        self._session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=30),
+            connector=aiohttp.TCPConnector(ssl=_SSL_CTX, limit=10, ttl_dns_cache=3600, keepalive_timeout=75)
+        )
+        
         # Start the monitoring task
-        self.csv_monitor.start()
+        self._monitor_task = asyncio.create_task(self._monitor())
         logger.info(f"CSV monitoring task started - checking every {CHECK_INTERVAL_HOURS} hours")
 
+    async def close(self) -> None:
+        """
+        Close the shared HTTP session, shut down the bot and flush buffered logs.
+        """
+        if self._session is not None:
+            await self._session.close()
+        await super().close()
+        _memory_handler.flush()
+
     async def on_ready(self) -> None:
         """
         Called when bot is ready and connected to Discord.
         
-        Sets bot status, sends webhook notification, initializes state,
-        and performs initial CSV check.
+        Sets bot status and sends webhook notification. State initialization
+        and the first CSV check are done by the monitoring task, so they run
+        exactly once even when Discord reconnects.
         """
         logger.info(f'Bot logged in as {self.user}')
         
@@ -93,11 +210,8 @@ class STRDBurnMonitor(discord.Client):
                                             f"Bot `{self.user}` is now monitoring STRD burns", 
                                             color=COLOR_SUCCESS)
         
-        # Get initial state from current username if possible
-        await self.initialize_from_username()
-        
-        # Perform initial check
-        await self.check_csv_update()
+        # Write out startup logs now rather than waiting for the buffer to fill
+        _memory_handler.flush()
 
     async def initialize_from_username(self) -> None:
         """
@@ -109,15 +223,16 @@ class STRDBurnMonitor(discord.Client):
         try:
             # Try to extract number from current username like "401,613 STRD Burned 🔥"
             if self.user and self.user.display_name:
-                match = re.search(r'([\d,]+)\s+STRD', self.user.display_name)
+                match = _USERNAME_RE.search(self.user.display_name)
                 if match:
-                    # Remove commas and convert to float
-                    self.last_total_burned = float(match.group(1).replace(',', ''))
-                    logger.info(f"Initialized from current username: {self.last_total_burned:,.0f} STRD")
+                    # Remove commas and convert to microSTRD
+                    self.last_total_burned_micro = int(match.group(1).replace(',', '')) * MICRO_STRD_DIVISOR
+                    logger.info(f"Initialized from current username: {match.group(1)} STRD")
         except Exception as e:
             logger.warning(f"Could not initialize from username: {e}")
 
-    async def send_webhook_notification(self, title: str, description: str, color: int = COLOR_STRD) -> None:
+    async def send_webhook_notification(self, title: str, description: str, color: int = COLOR_STRD,
+                                        timestamp: Optional[datetime] = None) -> None:
         """
         Send notification to webhook if configured.
         
@@ -125,134 +240,182 @@ class STRDBurnMonitor(discord.Client):
             title: The title of the notification embed
             description: The description text for the notification
             color: The color of the embed (default: STRD pink)
+            timestamp: Timezone-aware time for the embed (default: now, in UTC)
         """
-        if not burnbot_logs_webhookurl or burnbot_logs_webhookurl == "YOUR_WEBHOOK_URL_HERE":
+        if not self._webhook_enabled:
             return
             
         try:
-            async with aiohttp.ClientSession() as session:
-                embed = {
-                    "title": title,
-                    "description": description,
-                    "color": color,
-                    "timestamp": datetime.now().isoformat(),
-                    "footer": {
-                        "text": "STRD Burn Monitor"
-                    }
-                }
-                
-                payload = {
-                    "embeds": [embed]
-                }
-                
-                async with session.post(burnbot_logs_webhookurl, json=payload) as response:
-                    if response.status == 204:
-                        logger.info("Webhook notification sent successfully")
-                    else:
-                        logger.warning(f"Webhook failed with status {response.status}")
-                        
+            if timestamp is None:
+                timestamp = datetime.now(timezone.utc)
+            
+            embed = {
+                "title": title,
+                "description": description,
+                "color": color,
+                "timestamp": timestamp,
+                "footer": self._webhook_footer
+            }
+            
+            payload = {
+                "embeds": [embed]
+            }
+            
+            # orjson writes the datetime directly as an RFC 3339 "...Z" string
+            data = orjson.dumps(payload, option=orjson.OPT_UTC_Z | orjson.OPT_OMIT_MICROSECONDS)
+            
+            async with self._session.post(burnbot_logs_webhookurl, data=data, headers=_JSON_HEADERS) as response:
+                if response.status == 204:
+                    logger.info("Webhook notification sent successfully")
+                else:
+                    logger.warning(f"Webhook failed with status {response.status}")
+                    
         except Exception as e:
             logger.error(f"Error sending webhook notification: {e}")
 
-    async def fetch_csv_data(self) -> Tuple[Optional[str], Optional[float]]:
+    async def _read_csv_response(self, response: aiohttp.ClientResponse) -> Tuple[bytes, Optional[str], Optional[str]]:
+        """
+        Read the end of a full (200) or tail (206) CSV response.
+        
+        The body is streamed so only the last CSV_TAIL_BYTES are ever held in
+        memory. The response validators are returned rather than stored, so the
+        caller only keeps them once the body has been read and parsed.
+        
+        Args:
+            response: The successful CSV response
+            
+        Returns:
+            Tuple of (csv_tail, etag, last_modified) where csv_tail is the end
+            of the CSV as raw bytes, starting at a line boundary
+        """
+        # Content-Range looks like "bytes 1024-5119/5120"
+        truncated = (response.status == 206
+                     and not response.headers.get('Content-Range', '').startswith('bytes 0-'))
+        
+        # Stream the body and keep only its last CSV_TAIL_BYTES, which hold the rows we need
+        tail = b''
+        async for chunk in response.content.iter_chunked(CSV_TAIL_BYTES):
+            tail += chunk
+            if len(tail) > CSV_TAIL_BYTES:
+                tail = tail[-CSV_TAIL_BYTES:]
+                truncated = True
+        
+        if truncated:
+            # The tail starts mid-file, so its first line is probably incomplete
+            tail = tail.partition(b'\n')[2]
+        
+        return tail, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+    async def fetch_csv_data(self) -> Optional[int]:
         """
         Fetch and parse the latest CSV data.
         
+        Only the last CSV_TAIL_BYTES of the file are requested, since just the
+        final row is needed. The request is conditional on the validators from
+        the previous download, so an unchanged CSV is answered with 304 and no body.
+        
         Returns:
-            Tuple of (csv_hash, total_burned_strd) or (None, None) if failed
+            The total burned in microSTRD, or None if failed
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(burnbot_csv_url) as response:
+            headers = {'Range': f'bytes=-{CSV_TAIL_BYTES}'}
+            if self._etag:
+                headers['If-None-Match'] = self._etag
+            if self._last_modified:
+                headers['If-Modified-Since'] = self._last_modified
+            
+            async with self._session.get(burnbot_csv_url, headers=headers) as response:
+                if response.status == 304:
+                    logger.info("CSV not modified since last fetch")
+                    return self.last_total_burned_micro
+                
+                if response.status == 416:
+                    # Range not satisfiable (e.g. empty file) - fall back to a full download
+                    csv_tail = None
+                elif response.status not in (200, 206):
+                    logger.error(f"Failed to fetch CSV: HTTP {response.status}")
+                    return None
+                else:
+                    csv_tail, etag, last_modified = await self._read_csv_response(response)
+            
+            if csv_tail is None:
+                async with self._session.get(burnbot_csv_url) as response:
                     if response.status != 200:
                         logger.error(f"Failed to fetch CSV: HTTP {response.status}")
-                        return None, None
-                    
-                    csv_content = await response.text()
-                    
-                    # Calculate hash of CSV content to detect changes
-                    csv_hash = hashlib.md5(csv_content.encode()).hexdigest()
-                    
-                    # Parse the last line to get the latest total
-                    lines = csv_content.strip().split('\n')
-                    if not lines:
-                        logger.error("CSV file is empty")
-                        return csv_hash, None
-                    
-                    # Get the last valid line
-                    latest_total_micro_strd = None
-                    for line in reversed(lines):
-                        line = line.strip()
-                        if not line:
-                            continue
-                        
-                        parts = line.split(',')
-                        if len(parts) >= 2:
-                            try:
-                                latest_total_micro_strd = int(parts[1])
-                                break
-                            except ValueError:
-                                continue
-                    
-                    if latest_total_micro_strd is None:
-                        logger.error("Could not parse latest burn amount from CSV")
-                        return csv_hash, None
-                    
-                    # Convert microSTRD to STRD
-                    latest_total_strd = latest_total_micro_strd / MICRO_STRD_DIVISOR
-                    
-                    logger.info(f"Latest total burned: {latest_total_strd:,.6f} STRD")
-                    return csv_hash, latest_total_strd
+                        return None
                     
+                    csv_tail, etag, last_modified = await self._read_csv_response(response)
+            
+            latest_total_micro_strd = _parse_tail_fast(csv_tail)
+            if latest_total_micro_strd is None:
+                latest_total_micro_strd = _parse_tail_slow(csv_tail.decode('utf-8', 'ignore'))
+            
+            if latest_total_micro_strd is None:
+                logger.error("Could not parse latest burn amount from CSV")
+                return None
+            
+            # Only trust the validators once the total they describe has been parsed
+            self._etag = etag
+            self._last_modified = last_modified
+            
+            logger.info(f"Latest total burned: {format_strd(latest_total_micro_strd)} STRD")
+            return latest_total_micro_strd
+            
         except Exception as e:
             logger.error(f"Error fetching CSV data: {e}")
-            return None, None
+            return None
 
-    async def update_bot_username(self, total_burned: float) -> bool:
+    async def update_bot_username(self, total_micro: int, timestamp: Optional[datetime] = None) -> bool:
         """
         Update the bot's username with the current burn amount.
         
+        The edit is skipped when the formatted username is already applied,
+        since username changes are heavily rate limited.
+        
         Args:
-            total_burned: The total amount of STRD burned
+            total_micro: The total amount of microSTRD burned
+            timestamp: Timezone-aware time for the webhook embed (default: now)
             
         Returns:
             True if update was successful, False otherwise
         """
+        # Format the username with comma separators
+        display = total_micro // MICRO_STRD_DIVISOR
+        username = f"{display:,} STRD Burned 🔥"
+        
+        if username == self._last_username or (self.user and self.user.name == username):
+            logger.info("Username unchanged, skipping edit")
+            return True
+        
         try:
-            # Format the username with comma separators
-            username = f"{total_burned:,.0f} STRD Burned 🔥"
-            
-            try:
-                if self.user:
-                    await self.user.edit(username=username)
-                    logger.info(f"Updated username to: {username}")
-                    
-                    # Send webhook notification about the update
-                    await self.send_webhook_notification(
-                        "🔥 **STRD Burn Update**",
-                        f"Total burned: **{total_burned:,.0f} STRD**\nBot username updated to: `{username}`",
-                        color=COLOR_STRD
-                    )
-                    
-                    return True
-                else:
-                    logger.error("Bot user is None")
-                    return False
-            except discord.Forbidden:
-                logger.error("No permission to change username")
+            if not self.user:
+                logger.error("Bot user is None")
                 return False
-            except discord.HTTPException as e:
-                if "rate limited" in str(e).lower():
-                    logger.warning("Username change rate limited - Discord only allows 2 changes per hour")
-                else:
-                    logger.error(f"Error updating username: {e}")
-                return False
-            except Exception as e:
+            
+            await self.user.edit(username=username)
+            self._last_username = username
+            logger.info(f"Updated username to: {username}")
+            
+            # Send webhook notification about the update
+            await self.send_webhook_notification(
+                "🔥 **STRD Burn Update**",
+                f"Total burned: **{display:,} STRD**\nBot username updated to: `{username}`",
+                color=COLOR_STRD,
+                timestamp=timestamp
+            )
+            
+            return True
+        except discord.Forbidden:
+            logger.error("No permission to change username")
+            return False
+        except discord.HTTPException as e:
+            if "rate limited" in str(e).lower():
+                logger.warning("Username change rate limited - Discord only allows 2 changes per hour")
+            else:
                 logger.error(f"Error updating username: {e}")
-                return False
-                
+            return False
         except Exception as e:
-            logger.error(f"Error in update_bot_username: {e}")
+            logger.error(f"Error updating username: {e}")
             return False
 
     async def check_csv_update(self) -> None:
@@ -265,52 +428,60 @@ class STRDBurnMonitor(discord.Client):
         try:
             logger.info("Checking for CSV updates...")
             
-            csv_hash, total_burned = await self.fetch_csv_data()
+            total_micro = await self.fetch_csv_data()
             
-            if csv_hash is None or total_burned is None:
+            if total_micro is None:
                 logger.warning("Failed to fetch CSV data, skipping update")
                 return
             
-            # Check if the total has actually changed (more reliable than hash)
-            if abs(total_burned - self.last_total_burned) > 0.000001:  # Account for floating point precision
-                logger.info(f"Burn total changed from {self.last_total_burned:,.6f} to {total_burned:,.6f} STRD")
-                
-                # Update bot username
-                success = await self.update_bot_username(total_burned)
+            # Nothing to do if the total is unchanged (exact integer comparison)
+            if total_micro == self.last_total_burned_micro:
+                logger.debug("No changes in burn total detected")
+                return
+            
+            now = datetime.now(timezone.utc)
+            logger.info(f"Burn total changed from {format_strd(self.last_total_burned_micro)} "
+                        f"to {format_strd(total_micro)} STRD")
+            
+            # Update bot username
+            success = await self.update_bot_username(total_micro, timestamp=now)
+            
+            if success:
+                # Update in-memory state
+                self.last_total_burned_micro = total_micro
+                self.last_check_time = now.isoformat(timespec='seconds')
                 
-                if success:
-                    # Update in-memory state
-                    self.last_csv_hash = csv_hash
-                    self.last_total_burned = total_burned
-                    self.last_check_time = datetime.now().isoformat()
-                    
-                    logger.info(f"Bot updated successfully with {total_burned:,.6f} STRD burned")
-                else:
-                    logger.error("Failed to update bot username")
+                logger.info(f"Bot updated successfully with {format_strd(total_micro)} STRD burned")
             else:
-                logger.info("No changes in burn total detected")
-                # Still update hash and check time
-                self.last_csv_hash = csv_hash
-                self.last_check_time = datetime.now().isoformat()
+                logger.error("Failed to update bot username")
+                # Forget the validators so the next check re-downloads and retries
+                self._etag = None
+                self._last_modified = None
                 
         except Exception as e:
             logger.error(f"Error checking CSV update: {e}")
 
-    @tasks.loop(hours=CHECK_INTERVAL_HOURS)
-    async def csv_monitor(self) -> None:
+    async def _monitor(self) -> None:
         """
         Check for CSV updates every configured hours.
         
-        This is a background task that runs automatically.
-        """
-        await self.check_csv_update()
-
-    @csv_monitor.before_loop
-    async def before_csv_monitor(self) -> None:
-        """
-        Wait until bot is ready before starting the loop.
+        This is a background task started in setup_hook. It initializes state
+        from the current username, runs the first check once the bot is ready,
+        and schedules later wake-ups against a fixed deadline so the interval
+        does not drift with check time.
         """
         await self.wait_until_ready()
+        
+        # Get initial state from current username if possible
+        await self.initialize_from_username()
+        
+        loop = asyncio.get_running_loop()
+        interval = CHECK_INTERVAL_HOURS * 3600
+        next_wake = loop.time()
+        while not self.is_closed():
+            await self.check_csv_update()
+            next_wake += interval
+            await asyncio.sleep(max(0, next_wake - loop.time()))
 
 
 def main() -> None:
@@ -6,9 +6,8 @@ This script tests the core functionality without requiring Discord connection.
 
 import asyncio
 import aiohttp
-import hashlib
 import logging
-from typing import Optional, Tuple
+from typing import Optional
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -17,76 +16,152 @@ logger = logging.getLogger(__name__)
 # Configuration
 CSV_URL = 'https://storage.googleapis.com/stride-public-data/burn_data/strd_burn.csv'
 MICRO_STRD_DIVISOR = 1_000_000
+CSV_TAIL_BYTES = 4096
 
 
-async def fetch_csv_data() -> Tuple[Optional[str], Optional[float]]:
+def format_strd(total_micro: int) -> str:
+    """Format a microSTRD amount as STRD with six decimals using integer math."""
+    whole, fraction = divmod(total_micro, MICRO_STRD_DIVISOR)
+    return f"{whole:,}.{fraction:06d}"
+
+
+def parse_tail_fast(tail: bytes) -> Optional[int]:
+    """
+    Read the burn total from the final row of a well-formed CSV tail.
+    
+    The burn CSV is produced by Stride's own export, so it ends with a complete
+    ASCII row whose second column is the running total in microSTRD. That shape
+    is checked up front instead of handled with exceptions, and the bytes are
+    parsed directly without decoding.
+    
+    Args:
+        tail: The end of the CSV as raw bytes
+        
+    Returns:
+        The total burned in microSTRD, or None if the last row is not well-formed
+    """
+    last_line = tail.rstrip().rpartition(b'\n')[2]
+    parts = last_line.split(b',', 2)
+    if len(parts) < 2 or not parts[1].isdigit():
+        return None
+    return int(parts[1])
+
+
+def parse_tail_slow(csv_content: str) -> Optional[int]:
+    """
+    Find the burn total in the last valid line of the CSV.
+    
+    Fallback for when parse_tail_fast fails. Scans backwards from the end
+    without splitting the whole file, skipping blank and malformed lines.
+    
+    Args:
+        csv_content: The CSV text to scan
+        
+    Returns:
+        The total burned in microSTRD, or None if no line could be parsed
+    """
+    end = len(csv_content)
+    while end > 0:
+        newline = csv_content.rfind('\n', 0, end)
+        line = csv_content[newline + 1:end].strip()
+        end = newline
+        
+        parts = line.split(',', 2)
+        if len(parts) >= 2:
+            try:
+                return int(parts[1])
+            except ValueError:
+                continue
+    
+    return None
+
+
+async def read_csv_response(response: aiohttp.ClientResponse) -> bytes:
+    """
+    Read the end of a full (200) or tail (206) CSV response.
+    
+    Args:
+        response: The successful CSV response
+        
+    Returns:
+        The end of the CSV as raw bytes, starting at a line boundary
+    """
+    # Content-Range looks like "bytes 1024-5119/5120"
+    truncated = (response.status == 206
+                 and not response.headers.get('Content-Range', '').startswith('bytes 0-'))
+    
+    # Stream the body and keep only its last CSV_TAIL_BYTES, which hold the rows we need
+    tail = b''
+    async for chunk in response.content.iter_chunked(CSV_TAIL_BYTES):
+        tail += chunk
+        if len(tail) > CSV_TAIL_BYTES:
+            tail = tail[-CSV_TAIL_BYTES:]
+            truncated = True
+    
+    if truncated:
+        # The tail starts mid-file, so its first line is probably incomplete
+        tail = tail.partition(b'\n')[2]
+    
+    return tail
+
+
+async def fetch_csv_data(session: aiohttp.ClientSession) -> Optional[int]:
     """
     Fetch and parse the latest CSV data.
     
+    Args:
+        session: The HTTP session to fetch the CSV with
+    
     Returns:
-        Tuple of (csv_hash, total_burned_strd) or (None, None) if failed
+        The total burned in microSTRD, or None if failed
     """
     try:
-        async with aiohttp.ClientSession() as session:
+        async with session.get(CSV_URL, headers={'Range': f'bytes=-{CSV_TAIL_BYTES}'}) as response:
+            if response.status == 416:
+                # Range not satisfiable (e.g. empty file) - fall back to a full download
+                csv_tail = None
+            elif response.status not in (200, 206):
+                logger.error(f"Failed to fetch CSV: HTTP {response.status}")
+                return None
+            else:
+                csv_tail = await read_csv_response(response)
+        
+        if csv_tail is None:
             async with session.get(CSV_URL) as response:
                 if response.status != 200:
                     logger.error(f"Failed to fetch CSV: HTTP {response.status}")
-                    return None, None
-                
-                csv_content = await response.text()
-                
-                # Calculate hash of CSV content to detect changes
-                csv_hash = hashlib.md5(csv_content.encode()).hexdigest()
-                
-                # Parse the last line to get the latest total
-                lines = csv_content.strip().split('\n')
-                if not lines:
-                    logger.error("CSV file is empty")
-                    return csv_hash, None
-                
-                # Get the last valid line
-                latest_total_micro_strd = None
-                for line in reversed(lines):
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    parts = line.split(',')
-                    if len(parts) >= 2:
-                        try:
-                            latest_total_micro_strd = int(parts[1])
-                            break
-                        except ValueError:
-                            continue
-                
-                if latest_total_micro_strd is None:
-                    logger.error("Could not parse latest burn amount from CSV")
-                    return csv_hash, None
-                
-                # Convert microSTRD to STRD
-                latest_total_strd = latest_total_micro_strd / MICRO_STRD_DIVISOR
-                
-                logger.info(f"Latest total burned: {latest_total_strd:,.6f} STRD")
-                return csv_hash, latest_total_strd
+                    return None
                 
+                csv_tail = await read_csv_response(response)
+        
+        latest_total_micro_strd = parse_tail_fast(csv_tail)
+        if latest_total_micro_strd is None:
+            latest_total_micro_strd = parse_tail_slow(csv_tail.decode('utf-8', 'ignore'))
+        
+        if latest_total_micro_strd is None:
+            logger.error("Could not parse latest burn amount from CSV")
+            return None
+        
+        logger.info(f"Latest total burned: {format_strd(latest_total_micro_strd)} STRD")
+        return latest_total_micro_strd
+        
     except Exception as e:
         logger.error(f"Error fetching CSV data: {e}")
-        return None, None
+        return None
 
 
-async def test_csv_fetching():
+async def test_csv_fetching(session: aiohttp.ClientSession):
     """Test CSV fetching functionality."""
     print("🧪 Testing CSV fetching...")
     
-    csv_hash, total_burned = await fetch_csv_data()
+    total_micro = await fetch_csv_data(session)
     
-    if csv_hash and total_burned:
+    if total_micro:
         print(f"✅ Successfully fetched CSV data")
-        print(f"   CSV Hash: {csv_hash}")
-        print(f"   Total Burned: {total_burned:,.6f} STRD")
+        print(f"   Total Burned: {format_strd(total_micro)} STRD")
         
         # Test username formatting
-        username = f"{total_burned:,.0f} STRD Burned 🔥"
+        username = f"{total_micro // MICRO_STRD_DIVISOR:,} STRD Burned 🔥"
         print(f"   Username format: {username}")
         
         return True
@@ -95,24 +170,21 @@ async def test_csv_fetching():
         return False
 
 
-async def test_multiple_fetches():
+async def test_multiple_fetches(session: aiohttp.ClientSession):
     """Test multiple CSV fetches to ensure consistency."""
     print("\n🔄 Testing multiple CSV fetches...")
     
     results = []
     for i in range(3):
         print(f"   Fetch {i+1}/3...")
-        csv_hash, total_burned = await fetch_csv_data()
-        if csv_hash and total_burned:
-            results.append((csv_hash, total_burned))
+        total_micro = await fetch_csv_data(session)
+        if total_micro:
+            results.append(total_micro)
         await asyncio.sleep(1)  # Small delay between requests
     
     if len(results) == 3:
         # Check if all results are the same
-        hashes = [r[0] for r in results]
-        totals = [r[1] for r in results]
-        
-        if len(set(hashes)) == 1 and len(set(totals)) == 1:
+        if len(set(results)) == 1:
             print("✅ All fetches returned consistent data")
             return True
         else:
@@ -123,14 +195,22 @@ async def test_multiple_fetches():
         return False
 
 
+async def run_all():
+    """Run all tests on one event loop, sharing a single HTTP session."""
+    async with aiohttp.ClientSession() as session:
+        success1 = await test_csv_fetching(session)
+        success2 = await test_multiple_fetches(session)
+    
+    return success1, success2
+
+
 def main():
     """Main test function."""
     print("🚀 STRD Burn Monitor Bot - Test Suite")
     print("=" * 50)
     
     # Run tests
-    success1 = asyncio.run(test_csv_fetching())
-    success2 = asyncio.run(test_multiple_fetches())
+    success1, success2 = asyncio.run(run_all())
     
     print("\n" + "=" * 50)
     if success1 and success2: